@@ -23,6 +23,7 @@ async def health_check(
     """Проверка состояния всех сервисов"""
     
     ollama_available =  await ollama.is_available()
+    ollama_models_loaded = await ollama.resident_models_loaded() if ollama_available else {}
     tts_available = tts.is_available()
     
     all_healthy = whisper.is_loaded and ollama_available and tts_available
@@ -31,5 +32,7 @@ async def health_check(
         status = "healthy" if all_healthy else "unhealthy",
         whisper_loaded = whisper.is_loaded,
         ollama_available = ollama_available,
+        ollama_model_loaded = bool(ollama_models_loaded) and all(ollama_models_loaded.values()),
+        ollama_models_loaded = ollama_models_loaded,
         tts_available = tts_available
     )
@@ -0,0 +1,77 @@
+"""Эндпоинты для получения профилей запросов"""
+
+import io
+import json
+import pstats
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import FileResponse, PlainTextResponse
+from app.config import get_settings
+from app.core.profiling import check_admin_token, is_profiling_enabled, profile_path, timings_path
+from app.models.schemas import ProfileInfo
+
+router = APIRouter(prefix="/profiles", tags=["Профилирование"])
+
+
+def require_admin(
+    x_profile_token: Optional[str] = Header(default=None, description="Токен администратора"),
+):
+    """Доступ к профилям только с токеном администратора"""
+    if not is_profiling_enabled():
+        raise HTTPException(status_code=404, detail="Профилирование выключено")
+    if not check_admin_token(x_profile_token):
+        raise HTTPException(status_code=403, detail="Неверный токен администратора")
+
+
+@router.get(
+    "",
+    response_model=list[ProfileInfo],
+    summary="Список профилей",
+    description="Список сохранённых профилей запросов, новые первыми",
+    dependencies=[Depends(require_admin)],
+)
+async def list_profiles():
+    """Список сохранённых профилей"""
+    settings = get_settings()
+    if not settings.profiles_dir.exists():
+        return []
+
+    files = sorted(settings.profiles_dir.glob("profile_*.prof"), key=lambda f: f.stat().st_mtime, reverse=True)
+    return [
+        ProfileInfo(name=f.name, size=f.stat().st_size, created=f.stat().st_mtime)
+        for f in files
+    ]
+
+
+@router.get(
+    "/{name}",
+    summary="Получение профиля",
+    description="Файл профиля cProfile (открывается snakeviz/pstats) или текстовая сводка при format=text",
+    dependencies=[Depends(require_admin)],
+)
+async def get_profile(
+    name: str,
+    format: str = Query(default="prof", description="prof - файл профиля, text - сводка pstats"),
+    limit: int = Query(default=50, description="Число строк в текстовой сводке"),
+):
+    """Получение сохранённого профиля"""
+    path = profile_path(name)
+    if path is None or not path.exists():
+        raise HTTPException(status_code=404, detail="Профиль не найден")
+
+    if format == "text":
+        stream = io.StringIO()
+        if timings_path(path).exists():
+            timings = json.loads(timings_path(path).read_text())
+            stream.write("Wall-time сервисов, сек.:\n")
+            for service, seconds in timings.items():
+                stream.write(f"  {service}: {seconds}\n")
+            stream.write("\n")
+        pstats.Stats(str(path), stream=stream).sort_stats("cumulative").print_stats(limit)
+        return PlainTextResponse(stream.getvalue())
+
+    return FileResponse(
+        path=str(path),
+        media_type="application/octet-stream",
+        filename=name
+    )
@@ -78,7 +78,7 @@ async def process_voice(
             f.write(content)
             
         try:
-            text,language,duration = whisper.transcribe(temp_path)
+            text,language,duration = await whisper.transcribe_async(temp_path)
             if not text.strip():
                 raise HTTPException(
                     status_code=400,
@@ -106,7 +106,7 @@ async def process_voice(
         if generate_audio and settings.tts_enabled:
             try:
                 audio_filename = f"response_{uuid.uuid4().hex[:8]}.mp3"
-                audio_path = tts.synthesize(
+                audio_path = await tts.synthesize_async(
                     text=llm_response,
                     language=language or 'ru',
                     filename=audio_filename
@@ -154,7 +154,7 @@ async def transcribe_audio(
             content = await audio.read()
             f.write(content)
             
-        text, detected_lang, duration = whisper.transcribe(temp_path, language=language)
+        text, detected_lang, duration = await whisper.transcribe_async(temp_path, language=language)
         
         return TranscriptionResult(
             text=text,
@@ -182,7 +182,6 @@ async def generate_response(
     ollama: OllamaService = Depends(get_ollama),
 ):
     """Генерация ответа LLM"""
-    settings = get_settings()
     
     try:
         response = await ollama.chat(
@@ -192,7 +191,7 @@ async def generate_response(
         
         return LLMResponse(
             response=response,
-            model=settings.ollama_model
+            model=ollama.select_model(text)
         )
     except Exception as e:
         raise HTTPException(
@@ -213,7 +212,7 @@ async def synthesize_speech(
 ):
     """Преобразование текста в речь"""
     try:
-        audio_path = tts.synthesize(text=text, language=language)
+        audio_path = await tts.synthesize_async(text=text, language=language)
         return FileResponse(
             path=str(audio_path),
             media_type="audio/mpeg",
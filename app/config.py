@@ -1,5 +1,7 @@
 from functools import lru_cache
 from pathlib import Path
+from typing import Optional
+from pydantic import Field
 from pydantic_settings import BaseSettings
 
 
@@ -12,19 +14,50 @@ class Settings(BaseSettings):
     whisper_model_size: str = 'base'
     whisper_device: str = 'auto'
     whisper_compute_type: str = 'auto'
+    whisper_cpu_threads: int = 0 # 0 - по умолчанию ctranslate2
+    whisper_num_workers: Optional[int] = None # сколько распознаваний модель может вести параллельно, по умолчанию = whisper_concurrency
+    whisper_concurrency: int = Field(default=1, ge=1) # сколько распознаваний сервер реально выполняет одновременно, под это число идёт автоподбор
+    whisper_autotune: bool = False # подобрать compute_type, cpu_threads и num_workers бенчмарком при старте
+    whisper_autotune_clip: Optional[Path] = None # аудио с речью для бенчмарка, по умолчанию синтезируется через gTTS
+    whisper_autotune_rounds: int = 2
+    whisper_autotune_cache: Path = Path("cache/whisper_autotune.json")
 
 
     ollama_base_url: str = "http://localhost:11434"
     ollama_model: str = "llama3.2"
     ollama_timeout: int = 120
+    ollama_keep_alive: str = "30m" # сколько Ollama держит модель в памяти после запроса ("-1" - всегда)
+    ollama_preload: bool = True # загружать модель в память при старте
+    ollama_preload_retry_interval: int = 15 # пауза перед первым повтором предзагрузки в сек., дальше растёт вдвое
+    ollama_preload_max_attempts: int = Field(default=8, ge=1)
+    ollama_keep_warm_interval: int = 0 # период пингов для удержания модели в сек. (0 - выключено)
+    ollama_keep_warm_start_hour: int = 8 # пинги шлются только в рабочие часы [start, end), окно может переходить через полночь
+    ollama_keep_warm_end_hour: int = 20
+    ollama_small_model: Optional[str] = None # лёгкая модель для коротких запросов
+    ollama_small_model_max_chars: int = 80 # запросы не длиннее этого уходят в лёгкую модель
+
+    semantic_cache_enabled: bool = False # отвечать из кэша на похожие по смыслу вопросы, порог подбирать на реальных запросах
+    semantic_cache_embedding_model: str = "bge-m3" # мультиязычная модель, запросы на русском
+    semantic_cache_threshold: float = 0.92 # минимальная косинусная близость для попадания
+    semantic_cache_embed_timeout: float = 3.0 # таймаут эмбеддинга в сек., после него запрос уходит в LLM
+    semantic_cache_capacity: int = Field(default=1000, ge=1)
+    semantic_cache_path: Path = Path("cache/semantic_cache.npz")
 
     tts_enabled: bool = True
     tts_language: str = "ru"
+    tts_max_concurrency: int = Field(default=4, ge=1) # сколько кусков текста запрашиваются у Google TTS одновременно
+    tts_chunk_retries: int = Field(default=2, ge=0)
+    tts_timeout: int = 10
     
     upload_dir: Path = Path("uploads")
     output_dir: Path = Path("outputs")
     max_file_size: int = 25
     
+    profiling_admin_token: Optional[str] = None # токен для профилирования запросов по заголовку X-Profile-Token
+    profiling_sample_rate: int = 0 # профилировать каждый N-й запрос к /voice/* (0 - выключено)
+    profiles_dir: Path = Path("profiles")
+    profiling_max_files: int = Field(default=100, ge=1) # старые профили сверх этого числа удаляются
+    
     system_prompt: str = """Ты вежливы и полезный AI-ассистент. Отвечай на русском, кратко и по существу. Будь вежливым"""
     
 @lru_cache
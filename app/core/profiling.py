@@ -0,0 +1,230 @@
+"""
+Профилирование отдельных запросов к /voice/* через cProfile.
+Профиль снимается по токену администратора в заголовке X-Profile-Token
+(не в параметре запроса, чтобы токен не попадал в access-логи uvicorn)
+или для каждого N-го запроса, если задан profiling_sample_rate.
+
+Работа, вынесенная в рабочие потоки (Whisper, куски TTS), профилируется своим cProfile в потоке
+через profiled() и объединяется с профилем запроса. Ожидание HTTP-ответов Ollama cProfile не видит
+(корутина в это время приостановлена), поэтому вызовы сервисов дополнительно замеряются по wall-time
+через service_timer() и сохраняются рядом с профилем и в заголовке Server-Timing.
+
+Ограничение: cProfile работает на весь поток event loop, поэтому другие запросы,
+выполнявшиеся на loop в это же время, тоже попадают в профиль.
+Для чистого профиля запроса снимайте его при отсутствии другой нагрузки.
+"""
+
+import cProfile
+import functools
+import hmac
+import itertools
+import json
+import logging
+import pstats
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Callable, Optional
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "x-profile-token"
+PROFILE_ID_HEADER = "x-profile-id"
+PROFILED_PREFIX = "/voice/"
+
+
+class RequestProfile:
+    """Профиль одного запроса: профили рабочих потоков и wall-time вызовов сервисов"""
+
+    def __init__(self):
+        self._lock = threading.Lock() # дописывают разные потоки
+        self.thread_profilers: list[cProfile.Profile] = []
+        self.timings: dict[str, float] = {}
+
+    def run_in_thread(self, func: Callable, *args, **kwargs):
+        """Вызов func под отдельным cProfile текущего потока"""
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError: # Python 3.12+: профилировщик глобальный и уже занят профилем запроса
+            return func(*args, **kwargs)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profiler.disable()
+            with self._lock:
+                self.thread_profilers.append(profiler)
+
+    def add_timing(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self.timings[name] = self.timings.get(name, 0.0) + seconds
+
+
+# профиль текущего запроса, None если запрос не профилируется
+_current_profile: ContextVar[Optional[RequestProfile]] = ContextVar("current_profile", default=None)
+
+
+def profiled(func: Callable) -> Callable:
+    """Привязка функции к профилю текущего запроса для запуска в другом потоке.
+    Вызывать в потоке запроса, результат можно передавать в to_thread/executor.
+    Если запрос не профилируется, возвращает func как есть"""
+    profile = _current_profile.get()
+    if profile is None:
+        return func
+    return functools.partial(profile.run_in_thread, func)
+
+
+@contextmanager
+def service_timer(name: str):
+    """Замер wall-time вызова сервиса для профиля текущего запроса"""
+    profile = _current_profile.get()
+    if profile is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add_timing(name, time.perf_counter() - start)
+
+
+def _server_timing(timings: dict[str, float]) -> str:
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items())
+
+
+def timings_path(path: Path) -> Path:
+    """Файл с wall-time сервисов рядом с профилем"""
+    return path.with_suffix(".json")
+
+
+def is_profiling_enabled() -> bool:
+    """Профилирование включено, если задан токен администратора или частота выборки"""
+    settings = get_settings()
+    return bool(settings.profiling_admin_token) or settings.profiling_sample_rate > 0
+
+
+def check_admin_token(token: Optional[str]) -> bool:
+    """Сравнение токена с токеном администратора за постоянное время"""
+    admin_token = get_settings().profiling_admin_token
+    if not admin_token or not token:
+        return False
+    return hmac.compare_digest(token.encode(), admin_token.encode())
+
+
+def cleanup_old_profiles() -> int:
+    """Удаление старых профилей сверх profiling_max_files, чтобы каталог не рос бесконечно"""
+    settings = get_settings()
+    files = sorted(settings.profiles_dir.glob("profile_*.prof"), key=lambda f: f.stat().st_mtime, reverse=True)
+
+    removed = 0
+    for file in files[settings.profiling_max_files:]:
+        try:
+            file.unlink()
+            timings_path(file).unlink(missing_ok=True)
+            removed += 1
+        except Exception as e:
+            logger.info(f"Ошибка удаления профиля {file.name}:{e}")
+    return removed
+
+
+def profile_path(name: str) -> Optional[Path]:
+    """Путь к профилю по имени. None, если имя пытается выйти за пределы каталога профилей"""
+    profiles_dir = get_settings().profiles_dir
+    path = profiles_dir / name
+    if path.name != name or path.suffix != ".prof":
+        return None
+    return path
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware: оборачивает обработку запроса в cProfile и сохраняет профиль в profiles_dir.
+    Подключается только если профилирование включено, иначе накладных расходов нет совсем.
+    cProfile один на поток, поэтому одновременно профилируется только 1 запрос, остальные пропускаются.
+    Запросы, которые выполняются на event loop параллельно с профилируемым, тоже попадают в его профиль,
+    а их работа в рабочих потоках - нет: профиль запроса передаётся через ContextVar
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.settings = get_settings()
+        self._counter = itertools.count(1)
+        self._active = False
+
+    def _requested(self, scope) -> bool:
+        """Проверка токена администратора в заголовке"""
+        for name, value in scope.get("headers", []):
+            if name == PROFILE_HEADER.encode():
+                return check_admin_token(value.decode("latin-1"))
+        return False
+
+    def _sampled(self) -> bool:
+        rate = self.settings.profiling_sample_rate
+        return rate > 0 and next(self._counter) % rate == 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(PROFILED_PREFIX):
+            await self.app(scope, receive, send)
+            return
+
+        if not (self._requested(scope) or self._sampled()):
+            await self.app(scope, receive, send)
+            return
+
+        if self._active:
+            logger.info(f"Профилирование {scope['path']} пропущено: уже профилируется другой запрос")
+            await self.app(scope, receive, send)
+            return
+
+        endpoint = scope["path"][len(PROFILED_PREFIX):].split("/")[0] or "root"
+        profile_id = f"profile_{time.strftime('%Y%m%d_%H%M%S')}_{endpoint}_{uuid.uuid4().hex[:8]}.prof"
+
+        profile = RequestProfile()
+
+        async def send_with_profile_id(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((PROFILE_ID_HEADER.encode(), profile_id.encode()))
+                if profile.timings:
+                    headers.append((b"server-timing", _server_timing(profile.timings).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        profiler = cProfile.Profile()
+        self._active = True
+        context_token = _current_profile.set(profile)
+        profiler.enable()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            profiler.disable()
+            _current_profile.reset(context_token)
+            self._active = False
+            try:
+                self._save(profile_id, profiler, profile)
+                logger.info(f"Профиль запроса {scope['path']} сохранён: {profile_id}")
+                cleanup_old_profiles()
+            except Exception as e:
+                logger.warning(f"Не удалось сохранить профиль {profile_id}: {e}")
+
+    def _save(self, profile_id: str, profiler: cProfile.Profile, profile: RequestProfile) -> None:
+        """Объединение профиля event loop с профилями рабочих потоков и запись на диск"""
+        stats = pstats.Stats(profiler)
+        for thread_profiler in profile.thread_profilers:
+            try:
+                stats.add(thread_profiler)
+            except TypeError: # в потоке не было ни одного вызова
+                pass
+
+        self.settings.profiles_dir.mkdir(parents=True, exist_ok=True)
+        path = self.settings.profiles_dir / profile_id
+        stats.dump_stats(str(path))
+        timings_path(path).write_text(json.dumps(
+            {name: round(seconds, 4) for name, seconds in profile.timings.items()},
+            ensure_ascii=False,
+            indent=2,
+        ))
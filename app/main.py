@@ -7,7 +7,8 @@ import logging
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from app.config import get_settings
-from app.api.routes import voice,health
+from app.api.routes import voice,health,profiling
+from app.core.profiling import ProfilingMiddleware, is_profiling_enabled
 
 logging.basicConfig(
     level=logging.INFO,
@@ -31,6 +32,12 @@ async def lifespan(app: FastAPI):
             logger.info("Модель whisper успешно загружена")
         except Exception as e:
             logger.warning(f"Не удалось предзагрузить модель Whisper: {e}")
+            
+    from app.services.ollama_service import get_ollama_service
+    ollama = get_ollama_service()
+    if settings.ollama_preload and not settings.debug:
+        ollama.start_preload() # чтобы первый запрос не ждал загрузку модели в Ollama
+    ollama.start_keep_warm()
     
     logger.info(f"{settings.app_name} успешно запущен")
     
@@ -39,11 +46,20 @@ async def lifespan(app: FastAPI):
  
     logger.info(f"Завершение работы {settings.app_name}...")
     
+    await ollama.stop_background_tasks()
+    
+    if ollama.cache is not None:
+        try:
+            ollama.cache.save()
+        except Exception as e:
+            logger.warning(f"Не удалось сохранить семантический кэш: {e}")
+    
     # Очистка старых  файлов
     try:
         from app.services.tts_service import get_tts_service
         tts = get_tts_service()
         tts.cleanup_old_files(max_age_hours=1)
+        tts.close()
     except Exception:
         pass
     
@@ -72,6 +88,7 @@ def create_app() -> FastAPI:
 - **POST /voice/generate** — Только генерация текста LLM
 - **POST /voice/synthesize** — Только синтез речи
 - **GET /health** — Проверка состояния сервисов
+- **GET /profiles** — Профили запросов (нужен токен администратора)
         """,
         version="1.0.0",
         docs_url="/docs",
@@ -80,9 +97,14 @@ def create_app() -> FastAPI:
     )
     
     
+    # Без токена и выборки middleware не подключается, чтобы не было накладных расходов
+    if is_profiling_enabled():
+        app.add_middleware(ProfilingMiddleware)
+    
     # Подключение маршрутов
     app.include_router(health.router)
     app.include_router(voice.router)
+    app.include_router(profiling.router)
     
     return app
 
@@ -37,8 +37,17 @@ class HealthResponse(BaseModel):
     status: str = Field(default="healthy")
     whisper_loaded: bool = Field(default=False)
     ollama_available: bool = Field(default=False)
+    ollama_model_loaded: bool = Field(default=False, description="Находятся ли все удерживаемые модели в памяти Ollama")
+    ollama_models_loaded: dict[str, bool] = Field(default_factory=dict, description="Находится ли в памяти Ollama каждая удерживаемая модель")
     tts_available: bool = Field(default=True)
     
+class ProfileInfo(BaseModel):
+    """Сохранённый профиль запроса"""
+    
+    name: str = Field(..., description="Имя файла профиля")
+    size: int = Field(..., description="Размер файла в байтах")
+    created: float = Field(..., description="Время создания (unix timestamp)")
+    
 class ErrorResponse(BaseModel):
     """Ответ в случае ошибки"""
     
@@ -1,9 +1,13 @@
 """Cервис для взаимодействия с Ollama LLM"""
 
+import asyncio
 import logging 
-from typing import Optional
+from datetime import datetime
+from typing import Optional, Union
 import httpx
 from app.config import get_settings
+from app.core.profiling import service_timer
+from app.services.semantic_cache import SemanticCache, get_semantic_cache
 
 logger = logging.getLogger(__name__)
 _ollama_service: Optional["OllamaService"] = None
@@ -19,6 +23,45 @@ class OllamaService:
         self.base_url = self.settings.ollama_base_url
         self.model = self.settings.ollama_model
         self.timeout = self.settings.ollama_timeout
+        self.small_model = self.settings.ollama_small_model
+        self.keep_alive = self._parse_keep_alive(self.settings.ollama_keep_alive)
+        self._keep_warm_task: Optional[asyncio.Task] = None
+        self._preload_task: Optional[asyncio.Task] = None
+        self.cache: Optional[SemanticCache] = get_semantic_cache() if self.settings.semantic_cache_enabled else None
+        
+    @staticmethod
+    def _parse_keep_alive(value: str) -> Union[str, int]:
+        """Ollama принимает keep_alive либо строкой длительности ("30m"), либо числом секунд.
+        Число без единиц измерения ("-1", "3600") отправляем как int, иначе Ollama его не разберёт"""
+        try:
+            return int(value)
+        except ValueError:
+            return value
+        
+    @property
+    def models(self) -> list[str]:
+        """Все модели, между которыми распределяются запросы"""
+        if self.small_model and self.small_model != self.model:
+            return [self.model, self.small_model]
+        return [self.model]
+        
+    @property
+    def embedding_model(self) -> Optional[str]:
+        """Модель эмбеддингов семантического кэша, если он включён"""
+        return self.settings.semantic_cache_embedding_model if self.cache is not None else None
+        
+    @property
+    def resident_models(self) -> list[str]:
+        """Модели, которые держим в памяти Ollama: модели маршрутизации и модель эмбеддингов кэша"""
+        if self.embedding_model and self.embedding_model not in self.models:
+            return self.models + [self.embedding_model]
+        return self.models
+        
+    def select_model(self, user_message: str) -> str:
+        """Выбор модели под запрос: короткие запросы в лёгкую модель(если задана), остальные в основную"""
+        if self.small_model and len(user_message.strip()) <= self.settings.ollama_small_model_max_chars:
+            return self.small_model
+        return self.model
         
     async def chat(self, user_message: str, system_prompt: Optional[str] = None,) -> str:
         """запрос к Ollama LLM. Возвращает сгенерированный ответ текста"""
@@ -26,6 +69,19 @@ class OllamaService:
         if system_prompt is None:
             system_prompt = self.settings.system_prompt
             
+        model = self.select_model(user_message)
+        # раздел кэша - модель + системный промпт, чтобы ответ лёгкой модели не выдавался за ответ основной
+        cache_partition = f"{model}\n{system_prompt}"
+            
+        cache_vector = None
+        if self.cache is not None:
+            cache_vector = await self._embed_for_cache(user_message)
+            if cache_vector is not None:
+                cached = self.cache.lookup(cache_vector, cache_partition)
+                if cached is not None:
+                    logger.info(f"Ответ из семантического кэша, модель: {model}")
+                    return cached
+            
         message = [
             {"role": "system",
              "content": system_prompt},
@@ -33,12 +89,13 @@ class OllamaService:
              "content": user_message},
         ]
         
-        logger.info(f"Отправка сообщения  в Ollama")
+        logger.info(f"Отправка сообщения  в Ollama, модель: {model}")
         
         payload = {
-            "model": self.model,
+            "model": model,
             "messages": message,
             "stream": False,#чтобы фул ответ а не по частям
+            "keep_alive": self.keep_alive,#чтобы модель не выгружалась из памяти между запросами
             "options": {
                 "temperature": 0.7,#креативность
                 "top_p": 0.9,#выбор токенов по вероятности(из документации Cumulative probability threshold for nucleus sampling)
@@ -47,16 +104,19 @@ class OllamaService:
         
         try:
             async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.post(
-                    f"{self.base_url}/api/chat",
-                    json=payload
-                )
+                with service_timer("ollama.chat"):
+                    response = await client.post(
+                        f"{self.base_url}/api/chat",
+                        json=payload
+                    )
                 response.raise_for_status()
                 
                 result=response.json()
                 generate_text = result.get("message", {}).get("content", "")
                 
                 logger.info(f"Ответ LLM успешно сгенерирован: {generate_text}[:100]...")
+                if cache_vector is not None and generate_text:
+                    self._add_to_cache(cache_vector, cache_partition, generate_text)
                 return generate_text
             
         except httpx.TimeoutException:
@@ -69,6 +129,36 @@ class OllamaService:
             logger.error(f"Ошибка чата Ollama {e}")
             raise
         
+    async def embed(self, text: str, model: Optional[str] = None, timeout: Optional[float] = None) -> list[float]:
+        """Эмбеддинг текста через локальный эндпоинт Ollama /api/embed.
+        По умолчанию короткий таймаут: кэш не должен надолго задерживать генерацию"""
+        model = model or self.settings.semantic_cache_embedding_model
+        timeout = timeout or self.settings.semantic_cache_embed_timeout
+        
+        async with httpx.AsyncClient(timeout=timeout) as client:
+            with service_timer("ollama.embed"):
+                response = await client.post(
+                    f"{self.base_url}/api/embed",
+                    json={"model": model, "input": text, "keep_alive": self.keep_alive}
+                )
+            response.raise_for_status()
+            return response.json()["embeddings"][0]
+        
+    async def _embed_for_cache(self, user_message: str) -> Optional[list[float]]:
+        """Эмбеддинг запроса для семантического кэша. Ошибка кэша не должна ломать генерацию"""
+        try:
+            return await self.embed(user_message.strip().lower())
+        except Exception as e:
+            logger.warning(f"Семантический кэш недоступен, запрос уйдёт в LLM: {e}")
+            return None
+        
+    def _add_to_cache(self, vector: list[float], partition: str, answer: str) -> None:
+        """Запись ответа в семантический кэш. Ответ уже сгенерирован, ошибка кэша не должна его терять"""
+        try:
+            self.cache.add(vector, partition, answer)
+        except Exception as e:
+            logger.warning(f"Не удалось записать ответ в семантический кэш: {e}")
+        
     async def is_available(self) -> bool:
         """Проверка состояния. Если смогли получить список моделей то работает"""
         try:
@@ -77,6 +167,127 @@ class OllamaService:
                 return response.status_code == 200
         except Exception:
             return False
+        
+    async def preload(self, model: Optional[str] = None) -> None:
+        """Загрузка модели в память Ollama. Запрос /api/generate без prompt только загружает модель"""
+        model = model or self.model
+        logger.info(f"Предзагрузка модели Ollama: {model}")
+        
+        if model == self.embedding_model:
+            # модели эмбеддингов не поддерживают /api/generate, загружаем коротким эмбеддингом
+            await self.embed("ping", model=model, timeout=self.timeout)
+            return
+        
+        async with httpx.AsyncClient(timeout=self.timeout) as client:
+            response = await client.post(
+                f"{self.base_url}/api/generate",
+                json={"model": model, "keep_alive": self.keep_alive}
+            )
+            response.raise_for_status()
+            
+    async def preload_all(self, models: Optional[list[str]] = None) -> list[str]:
+        """Предзагрузка моделей (по умолчанию всех, которые держим в памяти).
+        Возвращает список моделей, которые загрузить не удалось"""
+        failed = []
+        for model in models or self.resident_models:
+            try:
+                await self.preload(model)
+            except Exception as e:
+                logger.warning(f"Не удалось предзагрузить модель Ollama {model}: {e}")
+                failed.append(model)
+        return failed
+        
+    async def _preload_loop(self, retry_interval: int, max_attempts: int) -> None:
+        """Повторяем предзагрузку не загрузившихся моделей: при старте в docker-compose
+        Ollama может быть ещё не запущена или модель ещё скачивается.
+        Пауза между попытками растёт вдвое (до 5 минут), после max_attempts попыток сдаёмся"""
+        pending = await self.preload_all()
+        for attempt in range(1, max_attempts):
+            if not pending:
+                break
+            delay = min(retry_interval * 2 ** (attempt - 1), 300)
+            logger.info(f"Повтор предзагрузки моделей Ollama {pending} через {delay} сек.")
+            await asyncio.sleep(delay)
+            pending = await self.preload_all(pending)
+            
+        if pending:
+            logger.warning(f"Модели Ollama {pending} не предзагружены за {max_attempts} попыток, первый запрос к ним будет медленным")
+        else:
+            logger.info("Модели Ollama предзагружены")
+        
+    def start_preload(self) -> None:
+        """Предзагрузка моделей в фоне, чтобы не задерживать старт приложения"""
+        if self._preload_task is not None:
+            return
+        self._preload_task = asyncio.create_task(self._preload_loop(
+            self.settings.ollama_preload_retry_interval,
+            self.settings.ollama_preload_max_attempts,
+        ))
+        
+    async def loaded_models(self) -> list[str]:
+        """Список моделей, которые сейчас находятся в памяти Ollama (/api/ps)"""
+        async with httpx.AsyncClient(timeout=5) as client:
+            response = await client.get(f"{self.base_url}/api/ps")
+            response.raise_for_status()
+            return [m.get("name", "") for m in response.json().get("models", [])]
+        
+    @staticmethod
+    def _is_in(model: str, loaded: list[str]) -> bool:
+        """Ollama добавляет тег ":latest" если он не указан"""
+        names = {model, model if ":" in model else f"{model}:latest"}
+        return any(name in names for name in loaded)
+        
+    async def is_model_loaded(self, model: Optional[str] = None) -> bool:
+        """Проверка, что модель сейчас в памяти"""
+        model = model or self.model
+        try:
+            return self._is_in(model, await self.loaded_models())
+        except Exception:
+            return False
+        
+    async def resident_models_loaded(self) -> dict[str, bool]:
+        """Какие из удерживаемых в памяти моделей (resident_models) сейчас загружены"""
+        try:
+            loaded = await self.loaded_models()
+        except Exception:
+            loaded = []
+        return {model: self._is_in(model, loaded) for model in self.resident_models}
+        
+    def _in_business_hours(self) -> bool:
+        hour = datetime.now().hour
+        start = self.settings.ollama_keep_warm_start_hour
+        end = self.settings.ollama_keep_warm_end_hour
+        if start <= end:
+            return start <= hour < end
+        return hour >= start or hour < end # окно через полночь, например 22-6
+        
+    async def _keep_warm_loop(self, interval: int) -> None:
+        """Периодически продлеваем keep_alive моделей, но только в рабочие часы"""
+        while True:
+            await asyncio.sleep(interval)
+            if self._in_business_hours():
+                await self.preload_all()
+                
+    def start_keep_warm(self) -> None:
+        """Запуск фоновых пингов, если задан ollama_keep_warm_interval"""
+        interval = self.settings.ollama_keep_warm_interval
+        if interval <= 0 or self._keep_warm_task is not None:
+            return
+        logger.info(f"Пинги Ollama для удержания модели каждые {interval} сек.")
+        self._keep_warm_task = asyncio.create_task(self._keep_warm_loop(interval))
+        
+    async def stop_background_tasks(self) -> None:
+        """Остановка фоновой предзагрузки и пингов"""
+        for task in (self._preload_task, self._keep_warm_task):
+            if task is None:
+                continue
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._preload_task = None
+        self._keep_warm_task = None
             
 def get_ollama_service() -> OllamaService:
     """Для создания или получения 1 и того же экземпляра сервисма Ollama"""
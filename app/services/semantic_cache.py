@@ -0,0 +1,203 @@
+"""Семантический кэш ответов LLM.
+Распознанная речь почти никогда не совпадает побайтно ("какая погода" и "какая сейчас погода"),
+поэтому ищем похожий вопрос по косинусной близости эмбеддингов, а не по точному совпадению строки.
+"""
+
+import hashlib
+import json
+import logging
+from pathlib import Path
+from typing import Optional
+import numpy as np
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+_semantic_cache: Optional["SemanticCache"] = None
+
+class SemanticCache:
+    """
+    Кэш ответов на основе эмбеддингов.
+    Все векторы лежат в одной непрерывной матрице (capacity, dim), поиск - одно матричное умножение.
+    Записи разделены на разделы (системный промпт + модель), при переполнении вытесняется давно неиспользуемая запись(LRU)
+    """
+
+    def __init__(self, capacity: int, threshold: float, path: Optional[Path] = None, embedding_model: str = ""):
+        self.capacity = capacity
+        self.threshold = threshold
+        self.path = path
+        self.embedding_model = embedding_model # векторы разных моделей несравнимы, храним вместе с кэшем
+
+        self._vectors: Optional[np.ndarray] = None # создаётся при первой записи, когда известна размерность
+        self._partitions = np.zeros(capacity, dtype=np.int64)
+        self._last_used = np.zeros(capacity, dtype=np.int64)
+        self._answers: list[str] = []
+        self._partition_ids: dict[str, int] = {}
+        self._size = 0
+        self._clock = 0 # монотонный счётчик обращений для LRU
+
+    def __len__(self) -> int:
+        return self._size
+
+    @staticmethod
+    def _partition_key(partition: str) -> str:
+        return hashlib.sha1(partition.encode("utf-8")).hexdigest()
+
+    def _partition_id(self, partition: str, create: bool = False) -> Optional[int]:
+        key = self._partition_key(partition)
+        if key not in self._partition_ids and create:
+            self._partition_ids[key] = len(self._partition_ids)
+        return self._partition_ids.get(key)
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        """Нормируем вектор, чтобы скалярное произведение было косинусной близостью"""
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def _tick(self) -> int:
+        self._clock += 1
+        return self._clock
+
+    def _top_k(self, vector, partition: str, k: int) -> list[tuple[int, float]]:
+        """Индексы и близости top-k записей раздела по убыванию близости"""
+
+        partition_id = self._partition_id(partition)
+        if partition_id is None or self._vectors is None or self._size == 0:
+            return []
+
+        query = self._normalize(vector)
+        if query.shape[0] != self._vectors.shape[1]:
+            return []
+
+        similarities = self._vectors[:self._size] @ query
+        similarities[self._partitions[:self._size] != partition_id] = -np.inf # чужие разделы не участвуют
+
+        k = min(k, self._size)
+        top = np.argpartition(-similarities, k - 1)[:k]
+        top = top[np.argsort(-similarities[top])]
+        return [(int(i), float(similarities[i])) for i in top if not np.isneginf(similarities[i])]
+
+    def search(self, vector, partition: str, k: int = 1) -> list[tuple[float, str]]:
+        """Top-k самых похожих записей в разделе.
+        Возвращает список (косинусная близость, ответ) по убыванию близости"""
+        return [(similarity, self._answers[i]) for i, similarity in self._top_k(vector, partition, k)]
+
+    def lookup(self, vector, partition: str) -> Optional[str]:
+        """Ответ на похожий вопрос из того же раздела, если близость выше порога"""
+        results = self._top_k(vector, partition, k=1)
+        if not results or results[0][1] < self.threshold:
+            return None
+
+        index, similarity = results[0]
+        self._last_used[index] = self._tick()
+        logger.info(f"Семантический кэш: попадание, близость {similarity:.3f}")
+        return self._answers[index]
+
+    def add(self, vector, partition: str, answer: str) -> None:
+        """Добавление ответа в кэш. При переполнении перезаписывается самая давно использованная запись"""
+
+        vector = self._normalize(vector)
+        if self._vectors is None:
+            self._vectors = np.zeros((self.capacity, vector.shape[0]), dtype=np.float32)
+        elif vector.shape[0] != self._vectors.shape[1]:
+            logger.warning("Семантический кэш: размерность эмбеддинга изменилась, кэш сброшен")
+            self.clear()
+            self._vectors = np.zeros((self.capacity, vector.shape[0]), dtype=np.float32)
+
+        if self._size < self.capacity:
+            index = self._size
+            self._answers.append(answer)
+            self._size += 1
+        else:
+            index = int(np.argmin(self._last_used[:self._size]))
+            self._answers[index] = answer
+
+        self._vectors[index] = vector
+        self._partitions[index] = self._partition_id(partition, create=True)
+        self._last_used[index] = self._tick()
+
+    def clear(self) -> None:
+        self._vectors = None
+        self._partitions[:] = 0
+        self._last_used[:] = 0
+        self._answers = []
+        self._partition_ids = {}
+        self._size = 0
+        self._clock = 0
+
+    def save(self, path: Optional[Path] = None) -> None:
+        """Сохранение кэша на диск в .npz (без pickle)"""
+        path = path or self.path
+        if path is None or self._vectors is None:
+            return
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        meta = {
+            "embedding_model": self.embedding_model,
+            "answers": self._answers,
+            "partition_ids": self._partition_ids,
+            "clock": self._clock,
+        }
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "wb") as f: # через файловый объект, иначе numpy допишет .npz к имени
+            np.savez(
+                f,
+                vectors=self._vectors[:self._size],
+                partitions=self._partitions[:self._size],
+                last_used=self._last_used[:self._size],
+                meta=np.array(json.dumps(meta, ensure_ascii=False)),
+            )
+        tmp_path.replace(path) # чтобы при падении во время записи не остался битый файл
+        logger.info(f"Семантический кэш сохранён: {path}, записей: {self._size}")
+
+    def load(self, path: Optional[Path] = None) -> None:
+        """Загрузка кэша с диска. Если записей больше capacity, остаются последние использованные"""
+        path = path or self.path
+        if path is None or not path.exists():
+            return
+
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                vectors = data["vectors"]
+                partitions = data["partitions"]
+                last_used = data["last_used"]
+                meta = json.loads(str(data["meta"]))
+        except Exception as e:
+            logger.warning(f"Не удалось загрузить семантический кэш {path}: {e}")
+            return
+
+        if meta.get("embedding_model") != self.embedding_model:
+            logger.info(f"Семантический кэш {path} построен другой моделью эмбеддингов, пропускаем")
+            return
+
+        keep = np.argsort(-last_used)[:self.capacity]
+        size = len(keep)
+
+        self.clear()
+        if size == 0:
+            return
+        self._vectors = np.zeros((self.capacity, vectors.shape[1]), dtype=np.float32)
+        self._vectors[:size] = vectors[keep]
+        self._partitions[:size] = partitions[keep]
+        self._last_used[:size] = last_used[keep]
+        self._answers = [meta["answers"][i] for i in keep]
+        self._partition_ids = meta["partition_ids"]
+        self._clock = meta["clock"]
+        self._size = size
+        logger.info(f"Семантический кэш загружен: {path}, записей: {size}")
+
+
+def get_semantic_cache() -> SemanticCache:
+    """Для создания или получения 1 и того же экземпляра семантического кэша"""
+    global _semantic_cache
+    if _semantic_cache is None:
+        settings = get_settings()
+        _semantic_cache = SemanticCache(
+            capacity=settings.semantic_cache_capacity,
+            threshold=settings.semantic_cache_threshold,
+            path=settings.semantic_cache_path,
+            embedding_model=settings.semantic_cache_embedding_model,
+        )
+        _semantic_cache.load()
+    return _semantic_cache
@@ -1,14 +1,22 @@
 """Синтез речи через gTTS"""
 
+import asyncio
+import base64
 import logging
+import re
+import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Optional
-from gtts import gTTS
+import httpx
+from gtts import gTTS, gTTSError
 from app.config import get_settings
+from app.core.profiling import profiled, service_timer
 
 logger=logging.getLogger(__name__)
 _tts_service: Optional["TTSService"] = None
+_AUDIO_PATTERN = re.compile(r'jQ1olc","\[\\"(.*)\\"]') # так же gTTS достаёт base64 аудио из ответа
 
 class TTSService:
     """Сервис преобразования текста в речь через gTTS"""
@@ -20,6 +28,41 @@ class TTSService:
         
         self.output_dir.mkdir(parents=True, exist_ok=True)
         
+        concurrency = self.settings.tts_max_concurrency
+        self.retries = self.settings.tts_chunk_retries
+        # общий пул keep-alive соединений, чтобы не открывать TLS на каждый кусок текста
+        self._client = httpx.Client(
+            timeout=self.settings.tts_timeout,
+            headers=gTTS.GOOGLE_TTS_HEADERS,
+            limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+        )
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="tts")
+        
+    def _fetch_chunk(self, url: str, data: str) -> bytes:
+        """Запрос одного куска текста к Google TTS с повторами. Возвращает MP3 байты"""
+        
+        for attempt in range(self.retries + 1):
+            try:
+                response = self._client.post(url, content=data)
+                response.raise_for_status()
+                
+                audio = b""
+                for line in response.text.splitlines():
+                    if gTTS.GOOGLE_TTS_RPC in line:
+                        match = _AUDIO_PATTERN.search(line)
+                        if not match:
+                            raise gTTSError("В ответе Google TTS нет аудио")
+                        audio += base64.b64decode(match.group(1))
+                if not audio:
+                    raise gTTSError("В ответе Google TTS нет аудио")
+                return audio
+            
+            except (httpx.HTTPError, gTTSError) as e:
+                if attempt == self.retries:
+                    raise gTTSError(f"Ошибка запроса к Google TTS: {e}")
+                logger.info(f"Повтор запроса к Google TTS ({attempt + 1}/{self.retries}): {e}")
+                time.sleep(0.5 * (attempt + 1))
+        
     def synthesize(
         self,
         text: str,
@@ -41,8 +84,22 @@ class TTSService:
         logger.info(f"Синтез речи. Язык: {language}")
         
         try:
+            # gTTS используем только для разбиения текста на куски <=100 символов и упаковки запросов,
+            # сами запросы шлём параллельно, иначе время синтеза растёт линейно с длиной ответа.
+            # get_bodies сам проверяет, что после разбиения остался текст
             tts = gTTS(text=text, lang=language, slow=False)
-            tts.save(str(output_path))
+            url = f"https://translate.google.{tts.tld}/_/TranslateWebserverUi/data/batchexecute"
+            bodies = tts.get_bodies()
+            
+            if len(bodies) == 1:
+                chunks = [self._fetch_chunk(url, bodies[0])]
+            else:
+                fetch_chunk = profiled(self._fetch_chunk) # куски профилируются вместе с запросом
+                chunks = list(self._executor.map(lambda body: fetch_chunk(url, body), bodies)) # map сохраняет порядок
+            
+            with open(output_path, "wb") as f:
+                for chunk in chunks:
+                    f.write(chunk) # MP3 кадры можно просто склеивать
             logger.info(f"Аудио сохранено: {output_path}")
             return output_path
         
@@ -50,13 +107,21 @@ class TTSService:
             logger.error(f"Ошибка синтеза речи через gTTS:{e}")
             raise
     
+    async def synthesize_async(
+        self,
+        text: str,
+        language: Optional[str] = None,
+        filename: Optional[str] = None
+    ) -> Path:
+        """Синтез в отдельном потоке: запросы к Google TTS и паузы между повторами не блокируют event loop"""
+        with service_timer("tts.synthesize"):
+            return await asyncio.to_thread(profiled(self.synthesize), text, language, filename)
+    
     def cleanup_old_files(self, max_age_hours: int = 1) -> int:
         """ Удаление старых сгенерированных аудио файлов. 
         Файлы, время последнего изменнеия которых больше 
         max_age_hours удаляются"""
         
-        import time
-        
         removed = 0
         max_age_seconds = max_age_hours * 3600
         current_time = time.time()
@@ -73,6 +138,11 @@ class TTSService:
         
         return removed
     
+    def close(self) -> None:
+        """Закрытие пула соединений и потоков"""
+        self._executor.shutdown(wait=False)
+        self._client.close()
+    
     @staticmethod
     def is_available() -> bool:
         """Проверка доступности сервиса TTS(нужен интернет)."""
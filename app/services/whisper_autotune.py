@@ -0,0 +1,193 @@
+"""
+Автоподбор параметров инференса Whisper под процессор.
+Распознаём короткий клип с речью на разных compute_type и разбиениях cpu_threads/num_workers
+и выбираем конфигурацию с наибольшей пропускной способностью при заданной конкурентности.
+Результат кэшируется на диск, чтобы следующие запуски не гоняли бенчмарк.
+"""
+
+import json
+import logging
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+import numpy as np
+from faster_whisper import WhisperModel, decode_audio
+from app.config import Settings
+from app.services.whisper_service import TRANSCRIBE_OPTIONS
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000 # faster-whisper ждёт моно 16 кГц
+CPU_COMPUTE_TYPES = ("int8", "int8_float32", "float32")
+BENCHMARK_TEXT = (
+    "Добрый день! Подскажите, пожалуйста, какая завтра будет погода в Москве "
+    "и стоит ли брать с собой зонт, если я собираюсь весь день гулять по центру города?"
+)
+
+
+def _cgroup_cpu_limit() -> Optional[float]:
+    """Лимит CPU из cgroup (в Docker --cpus), None если лимита нет"""
+    try:
+        # cgroup v2: "<quota> <period>" или "max <period>"
+        quota, period = Path("/sys/fs/cgroup/cpu.max").read_text().split()
+        if quota != "max":
+            return int(quota) / int(period)
+        return None
+    except (OSError, ValueError):
+        pass
+
+    try:
+        # cgroup v1
+        quota = int(Path("/sys/fs/cgroup/cpu/cpu.cfs_quota_us").read_text())
+        period = int(Path("/sys/fs/cgroup/cpu/cpu.cfs_period_us").read_text())
+        if quota > 0 and period > 0:
+            return quota / period
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def available_cpus() -> int:
+    """Число ядер, реально доступных процессу: affinity с учётом квоты cgroup"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError: # нет на Windows/Mac
+        cpus = os.cpu_count() or 1
+
+    limit = _cgroup_cpu_limit()
+    if limit is not None:
+        cpus = min(cpus, max(1, math.ceil(limit)))
+    return cpus
+
+
+def _candidate_compute_types() -> list[str]:
+    """compute_type, которые поддерживает CPU (int8 нужны инструкции, которых может не быть)"""
+    try:
+        import ctranslate2
+        supported = ctranslate2.get_supported_compute_types("cpu")
+        return [ct for ct in CPU_COMPUTE_TYPES if ct in supported]
+    except Exception:
+        return list(CPU_COMPUTE_TYPES)
+
+
+def _candidate_splits(cpus: int, concurrency: int) -> list[tuple[int, int]]:
+    """Разбиения ядер (cpu_threads, num_workers): больше воркеров - больше параллельных запросов,
+    но меньше потоков на каждый"""
+    splits = []
+    for workers in sorted({1, min(2, concurrency), concurrency}):
+        threads = max(1, cpus // workers)
+        if (threads, workers) not in splits:
+            splits.append((threads, workers))
+    return splits
+
+
+def _benchmark_clip(settings: Settings) -> np.ndarray:
+    """Клип с настоящей речью, чтобы в бенчмарке работал не только энкодер, но и декодер:
+    на синтетических тонах VAD и Whisper находят тишину и декодер почти не запускается.
+    Берём whisper_autotune_clip, если задан, иначе один раз синтезируем фразу через gTTS и кэшируем рядом с результатом"""
+    path = settings.whisper_autotune_clip
+    if path is None:
+        path = settings.whisper_autotune_cache.with_name("whisper_autotune_clip.mp3")
+        if not path.exists():
+            from gtts import gTTS
+            path.parent.mkdir(parents=True, exist_ok=True)
+            gTTS(text=BENCHMARK_TEXT, lang="ru").save(str(path))
+    return decode_audio(str(path), sampling_rate=SAMPLE_RATE)
+
+
+def _transcribe(model: WhisperModel, clip: np.ndarray) -> str:
+    """Распознавание с теми же параметрами, что и в WhisperService.transcribe"""
+    segments, _ = model.transcribe(clip, **TRANSCRIBE_OPTIONS)
+    return " ".join(segment.text.strip() for segment in segments) # segments - генератор, распознавание идёт при итерации
+
+
+def _measure(settings: Settings, compute_type: str, threads: int, workers: int, clip: np.ndarray, concurrency: int, rounds: int) -> float:
+    """Пропускная способность конфигурации: клипов в секунду при concurrency параллельных запросах"""
+    model = WhisperModel(
+        settings.whisper_model_size,
+        device="cpu",
+        compute_type=compute_type,
+        cpu_threads=threads,
+        num_workers=workers,
+    )
+    if not _transcribe(model, clip): # прогрев
+        raise RuntimeError("клип распознан как тишина, замер не отражает работу декодера")
+
+    total = concurrency * rounds
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(lambda _: _transcribe(model, clip), range(total)))
+    elapsed = time.perf_counter() - start
+
+    del model
+    return total / elapsed
+
+
+BENCHMARK_VERSION = 2 # меняется вместе с методикой замера, чтобы старые результаты не переиспользовались
+
+
+def _cache_key(settings: Settings, cpus: int) -> dict:
+    try:
+        import ctranslate2
+        ct2_version = ctranslate2.__version__
+    except Exception:
+        ct2_version = None
+    return {
+        "model_size": settings.whisper_model_size,
+        "cpus": cpus,
+        "concurrency": settings.whisper_concurrency,
+        "ctranslate2": ct2_version,
+        "clip": str(settings.whisper_autotune_clip) if settings.whisper_autotune_clip else None,
+        "benchmark": BENCHMARK_VERSION,
+    }
+
+
+def autotune(settings: Settings) -> dict:
+    """Подбор compute_type, cpu_threads и num_workers для CPU.
+    Возвращает словарь с этими ключами, результат берётся из кэша, если окружение не изменилось"""
+
+    cpus = available_cpus()
+    key = _cache_key(settings, cpus)
+    cache_path = settings.whisper_autotune_cache
+
+    if cache_path.exists():
+        try:
+            cached = json.loads(cache_path.read_text())
+            if cached.get("key") == key:
+                logger.info(f"Параметры Whisper из кэша автоподбора: {cached['config']}")
+                return cached["config"]
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Не удалось прочитать кэш автоподбора Whisper: {e}")
+
+    concurrency = max(1, settings.whisper_concurrency)
+    clip = _benchmark_clip(settings)
+    logger.info(f"Автоподбор параметров Whisper: ядер {cpus}, конкурентность {concurrency}")
+
+    best: Optional[dict] = None
+    best_throughput = 0.0
+    for compute_type in _candidate_compute_types():
+        for threads, workers in _candidate_splits(cpus, concurrency):
+            try:
+                throughput = _measure(settings, compute_type, threads, workers, clip, concurrency, settings.whisper_autotune_rounds)
+            except Exception as e:
+                logger.warning(f"Конфигурация {compute_type}, потоков {threads}, воркеров {workers} не работает: {e}")
+                continue
+
+            logger.info(f"{compute_type}, потоков {threads}, воркеров {workers}: {throughput:.2f} клипов/сек")
+            if throughput > best_throughput:
+                best_throughput = throughput
+                best = {"compute_type": compute_type, "cpu_threads": threads, "num_workers": workers}
+
+    if best is None:
+        raise RuntimeError("Автоподбор Whisper: ни одна конфигурация не запустилась")
+
+    logger.info(f"Выбраны параметры Whisper: {best}")
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        cache_path.write_text(json.dumps({"key": key, "config": best, "throughput": best_throughput}, indent=2))
+    except OSError as e:
+        logger.warning(f"Не удалось сохранить кэш автоподбора Whisper: {e}")
+    return best
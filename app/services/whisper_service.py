@@ -1,12 +1,21 @@
+import asyncio
 import logging
 from pathlib import Path 
 from typing import Optional
 from faster_whisper import WhisperModel
 from app.config import get_settings
+from app.core.profiling import profiled, service_timer
 
 logger=logging.getLogger(__name__)
 _whisper_service: Optional[WhisperModel] = None
 
+# параметры распознавания, общие для запросов и бенчмарка автоподбора
+TRANSCRIBE_OPTIONS = {
+    "beam_size": 5,#что-то про лучевой поиск(чем больше тем точнее, но медленнее)
+    "vad_filter": True, #фильтровать шум и тищину
+    "vad_parameters": {"min_silence_duration_ms": 500}, # интервал в мс, превысив который распознает как паузу
+}
+
 class WhisperService:
     """
     Сервис для преобразования речи в текст с помощью faster_service
@@ -15,6 +24,7 @@ class WhisperService:
     
     _instance: Optional["WhisperService"]=None #Форвардссылка так как на тот момент когда читает строку  класс еще не созд
     _model: Optional[WhisperModel] = None
+    _semaphore: Optional[asyncio.Semaphore] = None
     
     def __new__(cls) -> "WhisperService":
         """Синглтон паттерн так как модель whisper очень тяжелая.
@@ -29,6 +39,9 @@ class WhisperService:
         
         if self._model is None:
             self._load_model()
+        if self._semaphore is None:
+            # ограничивает число одновременных распознаваний, под это же число подбираются num_workers
+            self._semaphore = asyncio.Semaphore(max(1, get_settings().whisper_concurrency))
             
     def _load_model(self) -> None:
         """Загружаем whisper"""
@@ -36,17 +49,43 @@ class WhisperService:
         
         logger.info(f"Загружаем модель Whisper: {settings.whisper_model_size}, работает на {settings.whisper_device}")
         
+        params = {
+            "compute_type": settings.whisper_compute_type,
+            "cpu_threads": settings.whisper_cpu_threads,
+            "num_workers": settings.whisper_num_workers or max(1, settings.whisper_concurrency),
+        }
+        if settings.whisper_autotune:
+            params = self._autotune(settings) or params
+        
         try:
             self._model=WhisperModel(
                 settings.whisper_model_size,
                 device=settings.whisper_device,
-                compute_type=settings.whisper_compute_type,
+                **params,
             )
             logger.info("модель Whisper загружена")
         except Exception as e:
             logger.error(f"Ошибка загрузки модел  Whisper: {e}")
             raise
         
+    @staticmethod
+    def _autotune(settings) -> Optional[dict]:
+        """Автоподбор параметров для CPU. На GPU и при ошибке бенчмарка остаются параметры из настроек"""
+        device = settings.whisper_device
+        if device == "auto":
+            import ctranslate2
+            device = "cuda" if ctranslate2.get_cuda_device_count() > 0 else "cpu"
+        if device != "cpu":
+            logger.info(f"Автоподбор Whisper только для CPU, устройство: {device}")
+            return None
+        
+        try:
+            from app.services.whisper_autotune import autotune
+            return autotune(settings)
+        except Exception as e:
+            logger.warning(f"Автоподбор параметров Whisper не удался: {e}")
+            return None
+        
     def transcribe(self, audio_path: Path, language: Optional[str] = None) -> tuple[str,str,float]:
         """Преобразование аудио файла в текст
         возвращает кортеж(распознанный текст, определение языка, длительность)
@@ -60,9 +99,7 @@ class WhisperService:
             segments, info =self._model.transcribe(
                 str(audio_path),
                 language = language,
-                beam_size = 5,#что-то про лучевой поиск(чем больше тем точнее, но медленнее)
-                vad_filter = True, #фильтровать шум и тищину
-                vad_parameters={"min_silence_duration_ms": 500}, # интервал в мс, превысив который распознает как паузу
+                **TRANSCRIBE_OPTIONS,
             )
             
             text_parts = []
@@ -76,6 +113,14 @@ class WhisperService:
             logger.error(f"Ошибка распознавания речи: {e}")
             raise
     
+    async def transcribe_async(self, audio_path: Path, language: Optional[str] = None) -> tuple[str,str,float]:
+        """Распознавание в отдельном потоке, чтобы не блокировать event loop.
+        Одновременно идёт не больше whisper_concurrency распознаваний"""
+        async with self._semaphore:
+            with service_timer("whisper.transcribe"):
+                # profiled - чтобы распознавание попало в профиль запроса, если он профилируется
+                return await asyncio.to_thread(profiled(self.transcribe), audio_path, language)
+    
     @property
     def is_loaded(self) -> bool:
         return self._model is not None